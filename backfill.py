@@ -0,0 +1,353 @@
+import os
+import sys
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import signal
+
+from timeit import default_timer as timer
+
+import processPDF as pdf
+from processing import FILE_TYPES, encodeDoc, encodeLinks
+
+from constants import (BACKFILL_SHARD_SIZE, BACKFILL_TASK_TIMEOUT,
+                       BACKFILL_TASKS_PER_CHILD)
+from queries import MAKE_DOC_QUERY, MAKE_LINK_QUERY
+
+
+# file in the output directory recording which shards are complete
+CHECKPOINT_NAME = "checkpoint.jsonl"
+# file in the output directory recording which shards are in the database
+LOADED_NAME = "loaded.jsonl"
+
+# spacy model for this worker process, loaded once by initWorker
+workerNlp = None
+
+
+def findFiles(source: str) -> list[tuple[str, int | None]]:
+    # a directory is walked for every supported file in it
+    if os.path.isdir(source):
+        files = []
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in sorted(names):
+                if name.split('.')[-1].lower() in FILE_TYPES:
+                    files.append((os.path.join(root, name), None))
+        return files
+
+    # anything else is a manifest, one path per line,
+    # optionally followed by a tab and the drupal entity id
+    files = []
+    with open(source, 'r', encoding="utf8") as manifest:
+        for lineNo, line in enumerate(manifest, start=1):
+            line = line.rstrip("\n")
+            if line.strip() == "":
+                continue
+            path, _, entId = line.partition("\t")
+            entId = entId.strip()
+            if entId and not entId.isdigit():
+                msg = "{}:{}: entity id {!r} is not a number, skipping line"
+                print(msg.format(source, lineNo, entId), file=sys.stderr)
+                continue
+            files.append((path, int(entId) if entId else None))
+    return files
+
+
+def initWorker():
+    # leave keyboard interrupts to the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # load the spacy model once per worker, instead of once per pdf.
+    # should it fail, each pdf tries again and reports the error itself
+    global workerNlp
+    try:
+        workerNlp = pdf.loadModel()
+    except Exception:
+        workerNlp = None
+
+
+def processFile(job: tuple[str, int | None]) -> dict:
+    global workerNlp
+    path, entId = job
+    record = {"path": path, "entityId": entId}
+    fType = path.split('.')[-1].lower()
+    if fType not in FILE_TYPES:
+        record["error"] = f"Unsupported File type: {fType}"
+        return record
+
+    try:
+        if fType == "pdf":
+            if workerNlp is None:
+                workerNlp = pdf.loadModel()
+            result = pdf.process(path, nlp=workerNlp)
+        else:
+            result = FILE_TYPES[fType](path)
+        record["name"] = result["name"]
+        record["metadata"] = result["metadata"]
+        record["links"] = sorted(result["links"])
+        # pages are optional, not every file type has them
+        record["linkPages"] = result.get("linkPages", dict())
+        # only pdfs sample pages for headers and footers
+        if "pagesSampled" in result:
+            record["pagesSampled"] = result["pagesSampled"]
+    except Exception as e:
+        record["error"] = f"File processing failed, message: {e}"
+
+    return record
+
+
+def runJobs(jobs: list, workers: int, timeout: float):
+    # yields a record for every job, keeping one job per worker in flight.
+    # a job that takes longer than the timeout (or whose worker died, so it
+    # never finishes) is recorded as failed, and the pool is replaced so
+    # the stuck worker doesn't keep holding a slot
+    def newPool():
+        return multiprocessing.Pool(workers,
+                                    initializer=initWorker,
+                                    maxtasksperchild=BACKFILL_TASKS_PER_CHILD)
+
+    jobs = iter(jobs)
+    pool = newPool()
+    # list of [job, async result, start time]
+    pending = []
+    try:
+        while True:
+            while len(pending) < workers:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.append([job,
+                                pool.apply_async(processFile, (job,)),
+                                timer()])
+            if not pending:
+                return
+
+            pending[0][1].wait(0.1)
+            for entry in [entry for entry in pending if entry[1].ready()]:
+                pending.remove(entry)
+                yield entry[1].get()
+
+            stuck = [entry for entry in pending
+                     if timer() - entry[2] > timeout]
+            if stuck:
+                for entry in stuck:
+                    pending.remove(entry)
+                    msg = "File processing timed out after {}s, or its " \
+                          "worker died"
+                    yield {"path": entry[0][0],
+                           "entityId": entry[0][1],
+                           "error": msg.format(timeout)}
+                # restart everything else on a fresh pool
+                pool.terminate()
+                pool.join()
+                pool = newPool()
+                for entry in pending:
+                    entry[1] = pool.apply_async(processFile, (entry[0],))
+                    entry[2] = timer()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def readEntries(outDir: str, name: str) -> list[dict]:
+    path = os.path.join(outDir, name)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding="utf8") as entries:
+        return [json.loads(line) for line in entries if line.strip()]
+
+
+def appendEntry(outDir: str, name: str, entry: dict):
+    with open(os.path.join(outDir, name), 'a', encoding="utf8") as entries:
+        entries.write(json.dumps(entry) + "\n")
+
+
+class ShardWriter:
+    """
+    Writes records to numbered gzipped JSONL shards.
+    Shards are written to a temporary file and only renamed and added to
+    the checkpoint once complete, so a crash never leaves a partial shard
+    that looks finished.
+    """
+
+    def __init__(self, outDir: str, shard: int, shardSize: int):
+        self.outDir = outDir
+        self.shard = shard
+        self.shardSize = shardSize
+        self.file = None
+        self.paths: list[str] = []
+        self.failed: list[str] = []
+
+    def shardName(self) -> str:
+        return f"results-{self.shard:05d}.jsonl.gz"
+
+    def write(self, record: dict):
+        if self.file is None:
+            tmpPath = os.path.join(self.outDir, self.shardName() + ".tmp")
+            self.file = gzip.open(tmpPath, 'wt', encoding="utf8")
+        self.file.write(json.dumps(record) + "\n")
+        # failed files stay out of the done paths, so resuming retries them
+        if "error" in record:
+            self.failed.append(record["path"])
+        else:
+            self.paths.append(record["path"])
+        if len(self.paths) + len(self.failed) >= self.shardSize:
+            self.close()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        shardPath = os.path.join(self.outDir, self.shardName())
+        os.replace(shardPath + ".tmp", shardPath)
+        appendEntry(self.outDir, CHECKPOINT_NAME, {"shard": self.shard,
+                                                   "name": self.shardName(),
+                                                   "paths": self.paths,
+                                                   "failed": self.failed})
+        self.file = None
+        self.paths = []
+        self.failed = []
+        self.shard = self.shard + 1
+
+
+def loadShards(outDir: str) -> tuple[int, int]:
+    # returns how many documents were loaded, and how many shards failed
+    # import mysql here so machines without it can still process files
+    import mysql.connector
+    from config import DB_CONFIG
+
+    loadedShards = {entry["name"] for
+                    entry in readEntries(outDir, LOADED_NAME)}
+    loaded = 0
+    failedShards = 0
+    cnx = mysql.connector.connect(**DB_CONFIG)
+    cursor = cnx.cursor()
+    try:
+        for entry in readEntries(outDir, CHECKPOINT_NAME):
+            # skip shards a previous run already put in the database
+            if entry["name"] in loadedShards:
+                continue
+            docRows = []
+            linkRows = []
+            shardPath = os.path.join(outDir, entry["name"])
+            with gzip.open(shardPath, 'rt', encoding="utf8") as shard:
+                for line in shard:
+                    record = json.loads(line)
+                    if "error" in record:
+                        continue
+                    docRows.append(encodeDoc(record, record["entityId"]))
+                    linkRows.extend(encodeLinks(record))
+
+            # one transaction per shard
+            try:
+                cursor.executemany(MAKE_DOC_QUERY, docRows)
+                cursor.executemany(MAKE_LINK_QUERY, linkRows)
+                cnx.commit()
+            except mysql.connector.Error as e:
+                cnx.rollback()
+                failedShards = failedShards + 1
+                msg = "Error loading {} into database: {}"
+                print(msg.format(entry["name"], e), file=sys.stderr)
+                continue
+            appendEntry(outDir, LOADED_NAME, {"shard": entry["shard"],
+                                              "name": entry["name"]})
+            loaded = loaded + len(docRows)
+    finally:
+        cnx.close()
+
+    return loaded, failedShards
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Process a directory or manifest of files in parallel "
+                    "into sharded, gzipped JSONL."
+    )
+    parser.add_argument("source",
+                        help="directory to search for files, or a manifest "
+                             "with one path per line, optionally followed "
+                             "by a tab and the drupal entity id")
+    parser.add_argument("outDir",
+                        help="directory to write result shards to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of processes to use "
+                             "(default: all cores)")
+    parser.add_argument("--shard-size", type=int,
+                        default=BACKFILL_SHARD_SIZE,
+                        help="number of results per shard "
+                             f"(default: {BACKFILL_SHARD_SIZE})")
+    parser.add_argument("--timeout", type=float,
+                        default=BACKFILL_TASK_TIMEOUT,
+                        help="seconds a single file may take before it's "
+                             "counted as failed "
+                             f"(default: {BACKFILL_TASK_TIMEOUT})")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip files already processed successfully "
+                             "according to the output directory's "
+                             "checkpoint, failed files are retried")
+    parser.add_argument("--load", action="store_true",
+                        help="afterwards, insert every completed shard not "
+                             "already loaded into DocObjs/LinkObjs")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.outDir, exist_ok=True)
+    entries = readEntries(args.outDir, CHECKPOINT_NAME)
+    if entries and not args.resume:
+        msg = "{} already has a checkpoint, use --resume or another directory"
+        print(msg.format(args.outDir), file=sys.stderr)
+        return 1
+
+    done = {path for entry in entries for path in entry["paths"]}
+    nextShard = max([entry["shard"] + 1 for entry in entries], default=0)
+    jobs = [job for job in findFiles(args.source) if job[0] not in done]
+    if done:
+        msg = "Resuming, {} files already done, {} left"
+        print(msg.format(len(done), len(jobs)), file=sys.stderr)
+
+    writer = ShardWriter(args.outDir, nextShard, args.shard_size)
+    processed = 0
+    failed = 0
+    startTime = timer()
+    records = runJobs(jobs, max(1, args.workers), args.timeout)
+    try:
+        for record in records:
+            writer.write(record)
+            processed = processed + 1
+            if "error" in record:
+                failed = failed + 1
+            rate = processed / max(timer() - startTime, 1e-9)
+            msg = "\r{}/{} files, {} failed, {:.2f} files/s"
+            print(msg.format(processed, len(jobs), failed, rate),
+                  end="", file=sys.stderr)
+    except KeyboardInterrupt:
+        # keep everything written so far, it's all complete records
+        writer.close()
+        print("\nInterrupted, rerun with --resume to continue",
+              file=sys.stderr)
+        return 1
+    finally:
+        # stops the worker pool
+        records.close()
+    writer.close()
+    print(file=sys.stderr)
+
+    status = 0
+    if failed:
+        msg = "{} files failed, rerun with --resume to retry them"
+        print(msg.format(failed), file=sys.stderr)
+        status = 1
+
+    if args.load:
+        loaded, failedShards = loadShards(args.outDir)
+        print(f"Loaded {loaded} documents", file=sys.stderr)
+        if failedShards:
+            msg = "{} shards failed to load, rerun with --load to retry them"
+            print(msg.format(failedShards), file=sys.stderr)
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
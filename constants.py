@@ -8,3 +8,12 @@ PARSE_LIMIT = 10
 
 # Limit for document creation during the Drupal processing
 CREATE_LIMIT = 1200
+
+# Number of results written to each backfill output shard
+BACKFILL_SHARD_SIZE = 1000
+
+# Time (in seconds) a backfill file may take before it's treated as failed
+BACKFILL_TASK_TIMEOUT = 600
+
+# Number of files each backfill worker processes before it's replaced
+BACKFILL_TASKS_PER_CHILD = 200
@@ -4,29 +4,15 @@ import sys
 import mysql.connector
 import time
 import logging
-import base64
 import subprocess
-import json
 
 from timeit import default_timer as timer
-from types import FunctionType as function
 
-import processPDF as pdf
-import processXML as xml
+from processing import FILE_TYPES, encodeDoc, encodeLinks
 from config import DRUPAL_PATH, LOG_PATH, DB_CONFIG
 
 from constants import CYCLE_TIME, PARSE_LIMIT, CREATE_LIMIT
 
-
-# supported file types:
-# dictionary with following format:
-#  key:  file type extension
-#  value: function to process that type
-FILE_TYPES: dict[str, function] = {
-    "pdf": pdf.process,
-    "xml": xml.process
-}
-
 from queries import (TRANSACTION_LEVEL_QUERY, GET_PATHS_QUERY,
                      UPDATE_PATH_QUERY, DROP_PATH_QUERY,
                      MAKE_DOC_QUERY, MAKE_LINK_QUERY,
@@ -120,15 +106,8 @@ def main():
 
                 # read data from result:
                 try:
-                    # name
-                    b64Name = base64.b64encode(
-                        result["name"].encode()
-                    ).decode()
-                    # metadata
-                    metadata = base64.b64encode(
-                        json.dumps(result["metadata"]).encode()
-                    ).decode()
-                    links = result["links"]
+                    docRow = encodeDoc(result, entId)
+                    linkRows = encodeLinks(result)
                 except Exception:
                     msg1 = "\t{}\t| File processing did not complete."
                     msg2 = " returned dict does not contain required keys."
@@ -143,17 +122,11 @@ def main():
                     cursor.execute(DROP_PATH_QUERY, (pathId,))
 
                     # push new DocObj to database
-                    cursor.execute(MAKE_DOC_QUERY, (b64Name,
-                                                    metadata,
-                                                    entId,
-                                                    len(links)))
+                    cursor.execute(MAKE_DOC_QUERY, docRow)
 
                     # push links to database
-                    for link in links:
-                        b64Link = base64.b64encode(link.encode()).decode()
-                        cursor.execute(MAKE_LINK_QUERY, (b64Name,
-                                                         b64Link,
-                                                         "[]"))
+                    for linkRow in linkRows:
+                        cursor.execute(MAKE_LINK_QUERY, linkRow)
                 except mysql.connector.Error as e:
                     msg = "\t{}\t| Error pushing to database: {}"
                     logger.error(msg.format(timeNow(), e))
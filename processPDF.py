@@ -1,9 +1,15 @@
 import pymupdf as pdf
+import bisect
+import hashlib
+import logging
 import random
 import numpy
 import math
+import time
 import re
 
+from collections import OrderedDict
+
 # how similiar positions should be to each other to count as the same
 DIFF = 0.01
 # how much of the page should be checked for header/footer lines
@@ -11,6 +17,24 @@ LINE_FRAC = 0.3
 # should none be found,
 # how much of the page should be checked for headers and footers
 SEC_FRAC = 0.125
+# fewest pages to sample before checking if the header/footer estimate settled
+MIN_SAMPLE = 4
+# how many sampled pages in a row must leave the estimate unchanged to stop
+SETTLE_COUNT = 3
+# seed for picking which pages to sample, so results are reproducible
+SAMPLE_SEED = 0
+# fractional part of the golden ratio, used to spread samples over a document
+GOLDEN_FRAC = (math.sqrt(5) - 1)/2
+# spacy model used to find references
+SPACY_MODEL = "en_LRVSP_spacy"
+# how many document layouts to remember header/footer bands for
+LAYOUT_CACHE_SIZE = 256
+
+# header/footer bands of previously processed documents,
+# keyed by layout fingerprint
+layoutCache: OrderedDict[str, tuple] = OrderedDict()
+
+logger = logging.getLogger("LRVSP_Python")
 
 
 # class to make sure vectorising works correctly
@@ -21,17 +45,6 @@ class compBlock:
         self.block2 = block2
 
 
-# function for returning an object based on a boolean
-def zeroIfFalse(obj, val: bool):
-    if val:
-        return obj
-    else:
-        return 0
-
-
-zeroIfFalse = numpy.frompyfunc(zeroIfFalse, 2, 1)
-
-
 def isSimiliarBlock(obj: compBlock) -> bool:
     # done by checking if the two blocks share a x-edge and a y-edge,
     # or have similiar fonts
@@ -61,194 +74,331 @@ def isSimiliarBlock(obj: compBlock) -> bool:
 isSimiliarBlock = numpy.frompyfunc(isSimiliarBlock, 1, 1)
 
 
-def isSimiliarLine(obj: compBlock) -> bool:
-    return obj.block1["rect"] == obj.block2["rect"]
+def pageSignature(page: pdf.Page) -> tuple:
+    # describe the parts of a page layout that headers and footers depend on:
+    # page size, horizontal rule lines near the top and bottom of the page,
+    # and the text styles of the first and last blocks on the page.
+    # the page's text blocks are returned too, for checking cached bands
+    bound = page.bound()
+    rules = [line["rect"] for line in page.get_cdrawings() if
+             abs(line["rect"][0] - line["rect"][2]) >
+             abs(line["rect"][1] - line["rect"][3]) and
+             (line["rect"][3] < bound.height*LINE_FRAC or
+              line["rect"][1] > bound.height*(1-LINE_FRAC))]
+    ruleSig = tuple(sorted(tuple(round(x, 1) for x in rect)
+                           for rect in rules))
+
+    pageDict = page.get_text("dict")
+    blocks = [block for block in pageDict["blocks"] if "lines" in block]
+    edgeBlocks = blocks[:1] + blocks[-1:]
+    styleSig = tuple(sorted({(span["font"], round(span["size"], 1),
+                              span["color"]) for block in edgeBlocks
+                             for lines in block["lines"]
+                             for span in lines["spans"]}))
+
+    signature = ((round(bound.width, 1), round(bound.height, 1)),
+                 ruleSig,
+                 styleSig)
+    return signature, blocks
+
+
+def layoutFingerprint(doc: pdf.Document) -> tuple[str | None, list]:
+    # returns the fingerprint, and the text blocks of each probe page.
+    # skip the first page, it's usually a cover page with a different layout,
+    # and make sure there are two different pages to compare
+    if len(doc) < 3:
+        return None, []
+    probes = [1, max(2, len(doc)//2)]
+    probed = [pageSignature(doc[i]) for i in probes]
+    probeBlocks = [blocks for signature, blocks in probed]
+    signatures = {signature for signature, blocks in probed}
+    # the probe pages should share a layout,
+    # otherwise there's nothing reliable to cache against
+    if len(signatures) != 1:
+        return None, probeBlocks
+    fingerprint = hashlib.sha1(repr(signatures.pop()).encode()).hexdigest()
+    return fingerprint, probeBlocks
+
+
+def bandsFitPage(headerBottom, footerTop, blocks: list[dict]) -> bool:
+    # cheap check that cached bands suit a page:
+    # one of the page's edge blocks must sit inside each band,
+    # and no block may be cut in half by a band's edge
+    if headerBottom is not None:
+        if not any(block["bbox"][3] <= headerBottom + DIFF
+                   for block in blocks[:5]):
+            return False
+        if any(block["bbox"][1] < headerBottom - DIFF and
+               block["bbox"][3] > headerBottom + DIFF for block in blocks):
+            return False
+    if footerTop is not None:
+        if not any(block["bbox"][1] >= footerTop - DIFF
+                   for block in blocks[-5:]):
+            return False
+        if any(block["bbox"][1] < footerTop - DIFF and
+               block["bbox"][3] > footerTop + DIFF for block in blocks):
+            return False
+    return True
+
+
+def cachedLayout(fingerprint: str | None, probeBlocks: list) -> tuple | None:
+    if fingerprint not in layoutCache:
+        return None
+    headerBottom, footerTop = layoutCache[fingerprint]
+    if not all(bandsFitPage(headerBottom, footerTop, blocks)
+               for blocks in probeBlocks):
+        return None
+    # keep recently used layouts in the cache the longest
+    layoutCache.move_to_end(fingerprint)
+    return headerBottom, footerTop
+
+
+def cacheLayout(fingerprint: str, bands: tuple) -> None:
+    # forget the least recently used layout when the cache is full
+    layoutCache[fingerprint] = bands
+    layoutCache.move_to_end(fingerprint)
+    if len(layoutCache) > LAYOUT_CACHE_SIZE:
+        layoutCache.popitem(last=False)
+
+
+def samplePageOrder(pageTotal: int, limit: int, seed=SAMPLE_SEED) -> list:
+    # order pages so that any prefix of the order is spread across the whole
+    # document, by stepping through it in golden ratio sized jumps
+    # from a seeded starting point.
+    # the first page is skipped, it's usually a cover page
+    candidates = pageTotal - 1
+    limit = max(0, min(limit, candidates))
+    offset = random.Random(seed).random()
+    order = []
+    step = 0
+    while len(order) < limit:
+        page = 1 + math.floor(((offset + step*GOLDEN_FRAC) % 1)*candidates)
+        if page not in order:
+            order.append(page)
+        step = step + 1
+    return order
+
+
+def pageFeatures(page: pdf.Page) -> dict:
+    # get everything detection needs from a page, so it's only read once
+    height = page.bound().height
+    # get all drawings that are longer than they are tall
+    lines = [line for line in page.get_cdrawings() if
+             abs(line["rect"][0] - line["rect"][2]) >
+             abs(line["rect"][1] - line["rect"][3])]
+    # get first and last 5 blocks of the page
+    pageDict = page.get_text("dict")
+    blocks = [block for block in pageDict["blocks"] if "lines" in block]
+    possibleHeaders = blocks[:min(5, len(blocks))]
+    possibleFooters = blocks[max(-5, -len(blocks)):]
+    return {
+        "height": height,
+        "lines": lines,
+        "blocks": possibleHeaders + possibleFooters
+    }
+
+
+def addBlocks(pool: list, blocks: list[dict]) -> None:
+    # compare each new block against every block already in the pool,
+    # and store it along with the indices of the ones it's similiar to
+    for block in blocks:
+        matches = []
+        if pool:
+            pairArray = numpy.array([compBlock(block, old) for
+                                     old, oldMatches in pool])
+            matches = [i for i, similiar in
+                       enumerate(isSimiliarBlock(pairArray)) if similiar]
+        pool.append((block, matches))
+
+
+def countSimiliarPairs(pool: list, inArea) -> dict:
+    # count, for each block position, how many pairs of similiar blocks
+    # there are where both blocks are in the search area
+    counts = dict()
+    for block, matches in pool:
+        if not inArea(block):
+            continue
+        pairs = len([i for i in matches if inArea(pool[i][0])])
+        if pairs:
+            key = block["bbox"][0:4]
+            counts[key] = counts.get(key, 0) + pairs
+    return counts
+
+
+# keeps running counts of lines and blocks that repeat across sample pages,
+# so adding a page only compares it against the pages before it
+class bandSampler:
+    def __init__(self):
+        self.pageCount = 0
+        # height of the first page, used for the default search areas
+        self.height = None
+        # how many sampled pages each line position has been seen on
+        self.headerLines: dict[tuple, int] = dict()
+        self.footerLines: dict[tuple, int] = dict()
+        # blocks that could be headers or footers,
+        # paired with the indices of earlier blocks they're similiar to
+        self.headerBlocks: list[tuple[dict, list[int]]] = []
+        self.footerBlocks: list[tuple[dict, list[int]]] = []
+
+    def addPage(self, features: dict) -> None:
+        self.pageCount = self.pageCount + 1
+        height = features["height"]
+        if self.height is None:
+            self.height = height
+
+        # lines are the same line when their rects are exactly equal,
+        # so counting each rect is enough to count matching pairs
+        for line in features["lines"]:
+            rect = line["rect"]
+            if rect[3] < height*LINE_FRAC:
+                self.headerLines[rect] = self.headerLines.get(rect, 0) + 1
+            if rect[1] > height*(1-LINE_FRAC):
+                self.footerLines[rect] = self.footerLines.get(rect, 0) + 1
+
+        # header/footer search areas never reach past the line search area,
+        # so blocks outside it never need comparing
+        addBlocks(self.headerBlocks,
+                  [block for block in features["blocks"] if
+                   block["bbox"][3] < height*LINE_FRAC])
+        addBlocks(self.footerBlocks,
+                  [block for block in features["blocks"] if
+                   block["bbox"][1] > height*(1-LINE_FRAC)])
+
+    def bands(self) -> tuple:
+        # a line seen on k pages is in (k-1)k/2 matching pairs,
+        # it needs to be on most of the pages to count.
+        # last bit is to ensure that missing a single line on one page
+        # doesn't break recognition of it as a header/footer line
+        n = self.pageCount-math.ceil(self.pageCount/10)
+        badHeaderLines = [line for line, k in self.headerLines.items() if
+                          k > 1 and (k-1)*k/2 >= (n-1)*n/2]
+        badFooterLines = [line for line, k in self.footerLines.items() if
+                          k > 1 and (k-1)*k/2 >= (n-1)*n/2]
+
+        if badHeaderLines:
+            # get the header bar closest to the top of the page
+            badHeaderLines.sort(key=lambda x: x[1])
+            headerMax = badHeaderLines[0][1]
+        else:
+            # no header bar was found, search smaller area
+            headerMax = self.height*SEC_FRAC
 
+        if badFooterLines:
+            # get the footer bar closest to the bottom of the page
+            badFooterLines.sort(key=lambda x: x[3])
+            footerMin = badFooterLines[-1][3]
+        else:
+            # no footer bar was found, search smaller area
+            footerMin = self.height*(1-SEC_FRAC)
 
-isSimiliarLine = numpy.frompyfunc(isSimiliarLine, 1, 1)
+        badHeaderDict = countSimiliarPairs(
+            self.headerBlocks, lambda block: block["bbox"][3] < headerMax)
+        badFooterDict = countSimiliarPairs(
+            self.footerBlocks, lambda block: block["bbox"][1] > footerMin)
 
+        # should be more than half the pages to count (- safety margin)
+        n = math.floor(self.pageCount/2.2)-math.ceil(self.pageCount/10)
+        badHeaderBlocks = [block for block in badHeaderDict.keys()
+                           if badHeaderDict[block] > (n-1)*n/2]
+        badFooterBlocks = [block for block in badFooterDict.keys()
+                           if badFooterDict[block] > (n-1)*n/2]
 
-def removeHeaderFooter(doc: pdf.Document, pageCount=15) -> pdf.Document:
-    pageCount = min(pageCount, len(doc)-1)
-    # get random sequence of 15 pages
-    start = max(1, random.randint(1, max(len(doc)-15, 1)))
-    end = min(start + pageCount, len(doc))
-    pages: list[pdf.Page] = doc[start:end]
-
-    # check for header and footer lines
-    possibleHeaderLines = []
-    possibleFooterLines = []
-    for page in pages:
-        # get all drawings that are longer than they are tall
-        lines = [line for line in page.get_cdrawings() if
-                 abs(line["rect"][0] - line["rect"][2]) >
-                 abs(line["rect"][1] - line["rect"][3])]
-        headerLines = [line for line in lines if
-                       line["rect"][3] < page.bound().height*LINE_FRAC]
-        possibleHeaderLines = possibleHeaderLines + headerLines
-        footerLines = [line for line in lines if
-                       line["rect"][1] > page.bound().height*(1-LINE_FRAC)]
-        possibleFooterLines = possibleFooterLines + footerLines
-
-    # create matrices for comparison
-    headerLineMatrix = [[compBlock(row, col) for col in possibleHeaderLines]
-                        for row in possibleHeaderLines]
-    footerLineMatrix = [[compBlock(row, col) for col in possibleFooterLines]
-                        for row in possibleFooterLines]
-    headerLineArray = numpy.array(headerLineMatrix)
-    footerLineArray = numpy.array(footerLineMatrix)
-
-    # get which lines are the same across multiple pages
-    headerLinePosArray = [isSimiliarLine(obj) for obj in headerLineArray]
-    footerLinePosArray = [isSimiliarLine(obj) for obj in footerLineArray]
-
-    # get how many pages each line is on, follows the following formula:
-    #       (n-1)n
-    #  x = --------
-    #         2
-    # where x is the resulting count, and n is the number of pages
-    # only need to check the bottom triangle of the comparrison matrix
-    checkingHeaderLineIndices = numpy.tril(headerLinePosArray, -1)
-    checkingHeaderLines = zeroIfFalse(headerLineArray,
-                                      checkingHeaderLineIndices)
-    # get position values for similiar blocks
-    badHeaderLines = [line.block1["rect"] for line in
-                      checkingHeaderLines.flatten() if line]
-
-    badHeaderLineDict = dict()
-    for line in badHeaderLines:
-        badHeaderLineDict[line] = badHeaderLineDict.get(line, 0) + 1
-
-    # only need to check the bottom triangle of the comparrison matrix
-    checkingFooterLineIndices = numpy.tril(footerLinePosArray, -1)
-    checkingFooterLines = zeroIfFalse(footerLineArray,
-                                      checkingFooterLineIndices)
-    # get position values for similiar blocks
-    badFooterLines = [line.block1["rect"] for line in
-                      checkingFooterLines.flatten() if line]
-
-    badFooterLineDict = dict()
-    for line in badFooterLines:
-        badFooterLineDict[line] = badFooterLineDict.get(line, 0) + 1
-
-    # use the above formua to check if the lines are on most of the pages.
-    # last bit is to ensure that missing a single line on one page
-    # doesn't break recognition of it as a header/footer line
-    n = pageCount-math.ceil(pageCount/10)
-    badHeaderLines = [line for line in badHeaderLineDict.keys() if
-                      badHeaderLineDict[line] >= (n-1)*n/2]
-    badFooterLines = [line for line in badFooterLineDict.keys() if
-                      badFooterLineDict[line] >= (n-1)*n/2]
-
-    headerMax = False
-    if badHeaderLines:
-        # get the header bar closest to the top of the page
-        badHeaderLines.sort(key=lambda x: x[1])
-        headerMax = badHeaderLines[0][1]
-
-    footerMin = False
-    if badFooterLines:
-        # get the footer bar closest to the bottom of the page
-        badFooterLines.sort(key=lambda x: x[3])
-        footerMin = badFooterLines[-1][3]
-
-    possibleHeaderBlocks = []
-    possibleFooterBlocks = []
-    # get first and last 5 blocks of each page that are also in the search area
-    for page in pages:
-        if not headerMax:
-            # no header bar was found, search smaller area
-            headerMax = page.bound().height*SEC_FRAC
-        if not footerMin:
-            # no footer bar was found, search smaller area
-            footerMin = page.bound().height*(1-SEC_FRAC)
+        headerBottom = None
+        if badHeaderBlocks:
+            # get lowest y val
+            badHeaderBlocks.sort(key=lambda x: x[3], reverse=True)
+            headerBottom = badHeaderBlocks[0][3]
 
-        pageDict = page.get_text("dict")
-        blocks = [block for block in pageDict["blocks"] if "lines" in block]
-        possibleHeaders = blocks[:min(5, len(blocks))]
-        possibleFooters = blocks[max(-5, -len(blocks)):]
-        possibleHeaderFooters = possibleHeaders + possibleFooters
-        newHeaders = [block for block in possibleHeaderFooters if
-                      block["bbox"][3] < headerMax]
-        possibleHeaderBlocks = possibleHeaderBlocks + newHeaders
-        newFooters = [block for block in possibleHeaderFooters if
-                      block["bbox"][1] > footerMin]
-        possibleFooterBlocks = possibleFooterBlocks + newFooters
-
-    # create matrices for comparison
-    headerMatrix = [[compBlock(row, col) for col in possibleHeaderBlocks]
-                    for row in possibleHeaderBlocks]
-    footerMatrix = [[compBlock(row, col) for col in possibleFooterBlocks]
-                    for row in possibleFooterBlocks]
-    headerArray = numpy.array(headerMatrix)
-    footerArray = numpy.array(footerMatrix)
-
-    # determine how similiar each block is in position,
-    # true for blocks that share the same position across multiple pages.
-    headerPosArray = [isSimiliarBlock(obj) for obj in headerArray]
-    footerPosArray = [isSimiliarBlock(obj) for obj in footerArray]
-
-    # get how many pages share the same block. Uses the same formula from above
-    # only need to check the bottom triangle of the comparrison matrix
-    checkingHeaderIndices = numpy.tril(headerPosArray, -1)
-    checkingHeaders = zeroIfFalse(headerArray, checkingHeaderIndices)
-    # get position values for similiar blocks
-    badHeaderBlocks = [block.block1["bbox"][0:4] for
-                       block in checkingHeaders.flatten() if block]
-
-    badHeaderDict = dict()
-    for block in badHeaderBlocks:
-        badHeaderDict[block] = badHeaderDict.get(block, 0) + 1
-
-    # only need to check the bottom triangle of the comparrison matrix
-    checkingFooterIndices = numpy.tril(footerPosArray, -1)
-    checkingFooters = zeroIfFalse(footerArray, checkingFooterIndices)
-    # get position values for similiar blocks
-    badFooterBlocks = [block.block1["bbox"][0:4] for
-                       block in checkingFooters.flatten() if block]
-
-    badFooterDict = dict()
-    for block in badFooterBlocks:
-        badFooterDict[block] = badFooterDict.get(block, 0) + 1
-
-    # should be more than half the pages to count (- safety margin)
-    n = math.floor(pageCount/2.2)-math.ceil(pageCount/10)
-    badHeaderBlocks = [block for block in badHeaderDict.keys()
-                       if badHeaderDict[block] > (n-1)*n/2]
-    badFooterBlocks = [block for block in badFooterDict.keys()
-                       if badFooterDict[block] > (n-1)*n/2]
-
-    if badHeaderBlocks:
-        # get lowest y val
-        badHeaderBlocks.sort(key=lambda x: x[3], reverse=True)
-        headerBottom = badHeaderBlocks[0][3]
-
-    if badFooterBlocks:
-        # get highest y val
-        badFooterBlocks.sort(key=lambda x: x[1])
-        footerTop = badFooterBlocks[0][1]
+        footerTop = None
+        if badFooterBlocks:
+            # get highest y val
+            badFooterBlocks.sort(key=lambda x: x[1])
+            footerTop = badFooterBlocks[0][1]
+
+        return headerBottom, footerTop
+
+
+def findHeaderFooter(doc: pdf.Document, pageCount=15,
+                     seed=SAMPLE_SEED) -> tuple:
+    # add sample pages one at a time until the estimated bands stop changing
+    sampler = bandSampler()
+    # no estimate yet, None never equals a real estimate
+    bands = None
+    settled = 0
+    for i in samplePageOrder(len(doc), pageCount, seed):
+        sampler.addPage(pageFeatures(doc[i]))
+        if sampler.pageCount < MIN_SAMPLE:
+            continue
+        newBands = sampler.bands()
+        if newBands == bands:
+            settled = settled + 1
+        else:
+            settled = 0
+            bands = newBands
+        if settled >= SETTLE_COUNT:
+            break
+
+    if bands is None:
+        # too short to reach the minimum sample, use what we have
+        bands = sampler.bands() if sampler.pageCount else (None, None)
+
+    return bands[0], bands[1], sampler.pageCount
+
+
+def removeHeaderFooterWithSample(doc: pdf.Document,
+                                 pageCount=15) -> tuple[pdf.Document, int]:
+    # also returns how many pages were examined to find the bands
+    # documents from the same series share a layout,
+    # so reuse the bands found for an earlier document where possible
+    fingerprint, probeBlocks = layoutFingerprint(doc)
+    cached = cachedLayout(fingerprint, probeBlocks)
+    if cached is not None:
+        headerBottom, footerTop = cached
+        # only the probe pages were checked
+        examined = len(probeBlocks)
+        msg = "\t{}\t| Header/footer layout cached, checked {} probe pages"
+        logger.debug(msg.format(time.ctime(time.time()), len(probeBlocks)))
+    else:
+        headerBottom, footerTop, examined = findHeaderFooter(doc, pageCount)
+        msg = "\t{}\t| Header/footer detection examined {} of {} pages"
+        logger.debug(msg.format(time.ctime(time.time()), examined, len(doc)))
+        # only cache bands that were found,
+        # one bad sample shouldn't turn off removal for a whole layout
+        if fingerprint is not None and (headerBottom is not None or
+                                        footerTop is not None):
+            cacheLayout(fingerprint, (headerBottom, footerTop))
 
     for page in doc:
-        if badHeaderBlocks:
+        if headerBottom is not None:
             rect = pdf.Rect((0, 0),
                             (page.bound().width,
                              headerBottom))
             page.add_redact_annot(rect)
-        if badFooterBlocks:
+        if footerTop is not None:
             rect = pdf.Rect((0, footerTop),
                             (page.bound().width,
                              page.bound().height))
             page.add_redact_annot(rect)
         page.apply_redactions()
 
-    return doc
+    return doc, examined
 
 
-def extractText(doc: pdf.Document) -> str:
-    # initialise list of all blocks containing text
-    blockList = []
+def removeHeaderFooter(doc: pdf.Document, pageCount=15) -> pdf.Document:
+    outDoc, examined = removeHeaderFooterWithSample(doc, pageCount)
+    return outDoc
+
+
+def extractTextWithPages(doc: pdf.Document) -> tuple[str, list[int]]:
+    # initialise list of all text, and where in it each page starts
+    textList = []
+    pageStarts = []
+    textLength = 0
+    endsWithSpace = False
     # move through doc page by page
     for page in doc:
+        # initialise list of all blocks containing text on this page
+        blockList = []
         # get page contents
         pageDict = page.get_text("dict")
         # we're only interested in blocks that have text
@@ -353,19 +503,56 @@ def extractText(doc: pdf.Document) -> str:
                                                     b[3]))
             )
 
-    # convert list of text from blocks into a single string
-    outString = '\n'.join(blockList)
+        # record the character offset that this page starts at
+        pageStarts.append(textLength)
+        if not blockList:
+            continue
+
+        # convert list of text from blocks into a single string,
+        # separated from the previous page the same way blocks are
+        pageText = '\n'.join(blockList)
+        if textList:
+            pageText = '\n' + pageText
+
+        # remove extra spaces and non space characters
+        pageText = re.sub(r"[\s\a\u2003]+", r" ", pageText)
+        # spaces either side of a page break collapse into one
+        if endsWithSpace and pageText.startswith(" "):
+            pageText = pageText[1:]
+        if pageText:
+            endsWithSpace = pageText.endswith(" ")
 
-    # remove extra spaces and non space characters
-    outString = re.sub(r"[\s\a\u2003]+", r" ", outString)
+        textList.append(pageText)
+        textLength = textLength + len(pageText)
 
-    # write to file
-    return outString
+    # convert list of text from pages into a single string
+    outString = ''.join(textList)
 
+    return outString, pageStarts
 
-def process(path: str) -> dict[str, dict, set]:
+
+def extractText(doc: pdf.Document) -> str:
+    text, pageStarts = extractTextWithPages(doc)
+    return text
+
+
+def pagesForSpan(start: int, end: int, pageStarts: list[int]) -> range:
+    # find the (1 indexed) pages that the characters from start to end are on
+    firstPage = bisect.bisect_right(pageStarts, start)
+    lastPage = bisect.bisect_right(pageStarts, max(start, end-1))
+    return range(firstPage, lastPage+1)
+
+
+def loadModel():
     # import spacy here so machines without it can use the other functions
     import spacy
+    return spacy.load(SPACY_MODEL)
+
+
+def process(path: str, nlp=None) -> dict[str, dict, set]:
+    # load the spacy model, unless the caller already has it loaded
+    if nlp is None:
+        nlp = loadModel()
     with pdf.open(path) as inDoc:
         # get file name (and b64 encode it for later)
         name = path.split('/')[-1]
@@ -377,20 +564,28 @@ def process(path: str) -> dict[str, dict, set]:
         if fileId:
             fileName = fileName.removesuffix(fileId.group(0))
         # remove all headers and footers
-        outDoc = removeHeaderFooter(inDoc)
+        outDoc, pagesSampled = removeHeaderFooterWithSample(inDoc)
         # extract the text
-        text = extractText(outDoc)
+        text, pageStarts = extractTextWithPages(outDoc)
         # do spacy processing
-        nlp = spacy.load("en_LRVSP_spacy")
         doc = nlp(text)
-        links = {ent.text.removeprefix("the ") for ent in doc.ents
-                 if ent.label_ == "ref_doc"
-                 and 4*math.ceil((len(ent.text)/3)) < 255}
+        linkPages: dict[str, set] = dict()
+        for ent in doc.ents:
+            if (ent.label_ == "ref_doc"
+                    and 4*math.ceil((len(ent.text)/3)) < 255):
+                link = ent.text.removeprefix("the ")
+                pages = pagesForSpan(ent.start_char, ent.end_char, pageStarts)
+                linkPages.setdefault(link, set()).update(pages)
 
         retDict = {
             "name": fileName,
             "metadata": dict(),
-            "links": links
+            "links": set(linkPages.keys()),
+            # pages each link is referenced on
+            "linkPages": {link: sorted(pages) for
+                          link, pages in linkPages.items()},
+            # pages examined to find the headers and footers
+            "pagesSampled": pagesSampled
         }
 
         return retDict
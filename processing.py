@@ -0,0 +1,43 @@
+import base64
+import json
+
+from types import FunctionType as function
+
+import processPDF as pdf
+import processXML as xml
+
+
+# supported file types:
+# dictionary with following format:
+#  key:  file type extension
+#  value: function to process that type
+FILE_TYPES: dict[str, function] = {
+    "pdf": pdf.process,
+    "xml": xml.process
+}
+
+
+def encodeDoc(result: dict, entId: int | None) -> tuple:
+    # build the MAKE_DOC_QUERY parameters for a processing result
+    # name
+    b64Name = base64.b64encode(
+        result["name"].encode()
+    ).decode()
+    # metadata
+    metadata = base64.b64encode(
+        json.dumps(result["metadata"]).encode()
+    ).decode()
+    return (b64Name, metadata, entId, len(result["links"]))
+
+
+def encodeLinks(result: dict) -> list[tuple]:
+    # build the MAKE_LINK_QUERY parameters for each link in a result
+    b64Name = base64.b64encode(result["name"].encode()).decode()
+    # pages are optional, not every file type has them
+    linkPages = result.get("linkPages", dict())
+    rows = []
+    for link in result["links"]:
+        b64Link = base64.b64encode(link.encode()).decode()
+        pages = json.dumps(linkPages.get(link, []))
+        rows.append((b64Name, b64Link, pages))
+    return rows